@@ -0,0 +1,34 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+BOT_FILE = Path(__file__).resolve().parent.parent / "bot (7).py"
+
+
+def load_bot(workdir, database_url=None):
+    """Import the bot as a fresh module. It opens its storage on import, so that happens inside
+    workdir (bot.db is a relative path) and against database_url instead of the environment's."""
+    pytest.importorskip("aiogram")
+    cwd, env_url = os.getcwd(), os.environ.pop("DATABASE_URL", None)
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+    os.chdir(workdir)
+    try:
+        spec = importlib.util.spec_from_file_location("mailbot", BOT_FILE)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+        os.environ.pop("DATABASE_URL", None)
+        if env_url is not None:
+            os.environ["DATABASE_URL"] = env_url
+    return module
+
+
+@pytest.fixture(scope="module")
+def sqlite_bot(tmp_path_factory):
+    module = load_bot(tmp_path_factory.mktemp("bot"))
+    yield module
+    module.db.close()
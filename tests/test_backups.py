@@ -0,0 +1,120 @@
+"""bot.db snapshots: make_snapshot, rotation, restore and the run lock."""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+
+@pytest.fixture
+def store(sqlite_bot, tmp_path):
+    storage = sqlite_bot.SQLiteStorage(str(tmp_path / "bot.db"))
+    storage.touch_user(1, "u1", None)
+    storage.add_balance(1, 10, "admin_add")
+    # a few hundred KB, so the copy takes several backup steps
+    storage.add_stock("Gmail", [f"user{i}@gmail.com:{'x' * 200}" for i in range(2000)])
+    yield storage
+    storage.close()
+
+
+def write_db(path, value):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t(v)")
+    conn.execute("INSERT INTO t VALUES(?)", (value,))
+    conn.commit()
+    conn.close()
+
+
+def test_snapshot_is_a_full_checked_copy(sqlite_bot, store, tmp_path):
+    backups = str(tmp_path / "backups")
+    path = sqlite_bot.make_snapshot(store, backups)
+
+    assert sqlite_bot.list_snapshots(backups) == [path]
+    assert not [n for n in os.listdir(backups) if n.endswith(".part")]
+    assert sqlite_bot.check_integrity(path)
+    copy = sqlite3.connect(path)
+    try:
+        assert copy.execute("SELECT COUNT(*) FROM stock").fetchone()[0] == 2000
+        assert copy.execute("SELECT balance FROM users WHERE user_id=1").fetchone()[0] == 10.0
+    finally:
+        copy.close()
+
+
+def test_rotation_keeps_the_newest(sqlite_bot, store, tmp_path):
+    backups = tmp_path / "backups"
+    backups.mkdir()
+    for stamp in ("20250101-000000", "20250102-000000", "20250103-000000"):
+        write_db(str(backups / f"bot-{stamp}.db"), stamp)
+
+    path = sqlite_bot.make_snapshot(store, str(backups), keep=2)
+
+    assert sqlite_bot.list_snapshots(str(backups)) == [path, str(backups / "bot-20250103-000000.db")]
+
+
+def test_only_abandoned_part_files_are_cleared(sqlite_bot, store, tmp_path):
+    backups = tmp_path / "backups"
+    backups.mkdir()
+    abandoned, running = backups / "bot-20250101-000000.db.part", backups / "bot-20250102-000000.db.part"
+    abandoned.write_bytes(b"x")
+    running.write_bytes(b"x")
+    old = time.time() - sqlite_bot.BACKUP_STALE_PART - 60
+    os.utime(abandoned, (old, old))
+
+    sqlite_bot.make_snapshot(store, str(backups))
+
+    assert not abandoned.exists()
+    assert running.exists()
+
+
+def test_restore_brings_back_the_snapshot(sqlite_bot, store, tmp_path):
+    backups = str(tmp_path / "backups")
+    sqlite_bot.make_snapshot(store, backups)
+    store.clear_stock("Gmail")
+    store.set_balance(1, 0, "admin_set")
+
+    sqlite_bot.restore_snapshot(store, backup_dir=backups)
+
+    assert store.stock_counts() == {"Gmail": 2000}
+    assert store.get_balance(1) == 10.0
+    assert store.reconcile() == []
+
+
+def test_restore_refuses_missing_or_damaged_snapshots(sqlite_bot, store, tmp_path):
+    backups = tmp_path / "backups"
+    with pytest.raises(RuntimeError):
+        sqlite_bot.restore_snapshot(store, backup_dir=str(backups))
+    with pytest.raises(RuntimeError):
+        sqlite_bot.restore_snapshot(store, str(backups / "bot-20250101-000000.db"))
+
+    backups.mkdir()
+    damaged = backups / "bot-20250101-000000.db"
+    damaged.write_bytes(b"not a database" * 100)
+    with pytest.raises(RuntimeError):
+        sqlite_bot.restore_snapshot(store, backup_dir=str(backups))
+    assert store.get_balance(1) == 10.0
+
+
+def test_bot_running_sees_the_run_lock(sqlite_bot, tmp_path):
+    if sqlite_bot.fcntl is None:
+        pytest.skip("no fcntl here")
+    lock = str(tmp_path / "bot.db.lock")
+    assert not sqlite_bot.bot_running(lock)
+
+    holder = subprocess.Popen(
+        [sys.executable, "-c",
+         "import fcntl, os, sys, time\n"
+         "fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT)\n"
+         "fcntl.flock(fd, fcntl.LOCK_EX)\n"
+         "print('locked', flush=True)\n"
+         "time.sleep(60)\n", lock],
+        stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        assert sqlite_bot.bot_running(lock)
+    finally:
+        holder.kill()
+        holder.wait()
+    assert not sqlite_bot.bot_running(lock)
@@ -0,0 +1,147 @@
+"""PostgresStorage checks against a real server.
+
+Point TEST_DATABASE_URL at a throwaway database (its tables are truncated):
+  TEST_DATABASE_URL=postgresql://localhost/mailbot_test python -m pytest tests
+"""
+
+import os
+import threading
+
+import pytest
+
+from conftest import load_bot
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+
+@pytest.fixture(scope="module")
+def bot_module(tmp_path_factory):
+    pytest.importorskip("psycopg2")
+    module = load_bot(tmp_path_factory.mktemp("bot"), TEST_DATABASE_URL)
+    yield module
+    module.db.close()
+
+
+@pytest.fixture
+def pg(bot_module):
+    storage = bot_module.db
+    with storage._cursor() as cur:
+        cur.execute("TRUNCATE users, stock, deposits, settings, ledger, ledger_checkpoint RESTART IDENTITY")
+    return storage
+
+
+def run_threads(n, target):
+    results = [None] * n
+    def worker(i):
+        results[i] = target(i)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_purchases_never_sell_an_item_twice(pg):
+    for uid in range(1, 11):
+        pg.touch_user(uid, f"u{uid}", None)
+        pg.add_balance(uid, 10, "admin_add")
+    pg.add_stock("Gmail", ["a:1", "b:2", "c:3"])
+
+    results = run_threads(10, lambda i: pg.purchase(i + 1, "Gmail", 1, 4.0))
+
+    sold = [mails[0] for status, mails in results if status == "ok"]
+    assert sorted(sold) == ["a:1", "b:2", "c:3"]
+    assert all(status == "no_stock" for status, _ in results if status != "ok")
+    assert pg.stock_counts() == {}
+    assert pg.reconcile() == []
+
+
+def test_purchase_skips_rows_locked_by_another_buyer(pg):
+    pg.touch_user(1, "u1", None)
+    pg.add_balance(1, 10, "admin_add")
+    pg.add_stock("Gmail", ["first", "second"])
+
+    import psycopg2
+    other = psycopg2.connect(TEST_DATABASE_URL)
+    try:
+        with other.cursor() as cur:
+            cur.execute("SELECT id FROM stock WHERE emailpass='first' FOR UPDATE")
+            # would block on the locked row without SKIP LOCKED
+            assert pg.purchase(1, "Gmail", 1, 4.0) == ("ok", ["second"])
+    finally:
+        other.rollback()
+        other.close()
+
+
+def test_deposit_is_credited_once(pg):
+    pg.touch_user(1, "u1", None)
+    dep_id = pg.add_deposit(1, "bkash", "017", 50.0, "tx1")
+
+    results = run_threads(5, lambda i: pg.approve_deposit(dep_id))
+
+    assert results.count(True) == 1
+    assert pg.get_balance(1) == 50.0
+    assert not pg.reject_deposit(dep_id)
+    assert [row[2:4] for row in pg.history(1, 10)] == [("deposit", str(dep_id))]
+
+
+def test_migrate_round_trip(pg, bot_module, tmp_path):
+    src = bot_module.SQLiteStorage(str(tmp_path / "bot.db"))
+    src.touch_user(1, "u1", "2026-01-01T00:00:00")
+    src.add_balance(1, 30, "admin_add")
+    src.add_stock("Gmail", ["a:1", "b:2"])
+    src.purchase(1, "Gmail", 1, 4.0)
+    src.add_deposit(1, "nagad", "015", 20.0, "tx")
+    src.set_setting("support_username", "helper")
+
+    bot_module.migrate_bot_db(src.path, pg)
+
+    for table, columns in bot_module.TABLE_COLUMNS.items():
+        order = columns[0]
+        expected = src.conn.execute(f"SELECT {','.join(columns)} FROM {table} ORDER BY {order}").fetchall()
+        with pg._cursor() as cur:
+            cur.execute(f"SELECT {','.join(columns)} FROM {table} ORDER BY {order}")
+            assert cur.fetchall() == expected, table
+    assert pg.reconcile() == []
+    # serials continue after the copied ids
+    assert pg.add_deposit(1, "bkash", "017", 20.0, "tx2") == 2
+
+    # a second run must not bring sold stock back
+    pg.purchase(1, "Gmail", 1, 4.0)
+    with pytest.raises(RuntimeError):
+        bot_module.migrate_bot_db(src.path, pg)
+    assert pg.stock_counts() == {}
+    src.close()
+
+
+def test_set_balance_stores_the_exact_amount(pg):
+    pg.touch_user(1, "u1", None)
+    pg.add_balance(1, 0.1, "admin_add")
+    pg.add_balance(1, 0.2, "admin_add")
+
+    assert pg.set_balance(1, 7.1, "admin_set")
+    assert pg.get_balance(1) == 7.1
+    assert pg.history(1, 1)[0][1] == 7.1
+    assert not pg.set_balance(2, 1.0, "admin_set")
+
+
+def test_reconcile_only_reads_new_ledger_rows(pg):
+    for uid in (1, 2, 3):
+        pg.touch_user(uid, f"u{uid}", None)
+        pg.add_balance(uid, 10, "admin_add")
+    assert pg.reconcile(batch=2) == []
+    with pg._cursor() as cur:
+        cur.execute("SELECT user_id, last_id, total FROM ledger_checkpoint ORDER BY user_id")
+        assert cur.fetchall() == [(1, 1, 10.0), (2, 2, 10.0), (3, 3, 10.0)]
+
+    pg.add_balance(2, -4, "admin_del")
+    with pg._cursor() as cur:
+        # an already folded row changing is not re-read; a cached balance going off is caught
+        cur.execute("UPDATE ledger SET delta=99 WHERE id=1")
+        cur.execute("UPDATE users SET balance=12 WHERE user_id=3")
+    assert pg.reconcile(batch=2) == [(3, 12.0, 10.0)]
+    with pg._cursor() as cur:
+        cur.execute("SELECT last_id, total FROM ledger_checkpoint WHERE user_id=2")
+        assert cur.fetchone() == (4, 6.0)
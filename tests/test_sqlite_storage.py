@@ -0,0 +1,113 @@
+"""SQLiteStorage, the default backend: ledger rows, deposits and reconciliation."""
+
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+@pytest.fixture
+def store(sqlite_bot, tmp_path):
+    storage = sqlite_bot.SQLiteStorage(str(tmp_path / "bot.db"))
+    yield storage
+    storage.close()
+
+
+def ledger(store):
+    return store.conn.execute("SELECT user_id, delta, balance_after, reason, ref FROM ledger ORDER BY id").fetchall()
+
+
+def checkpoints(store):
+    return store.conn.execute("SELECT user_id, last_id, total FROM ledger_checkpoint ORDER BY user_id").fetchall()
+
+
+def test_every_balance_change_writes_a_ledger_row(store):
+    store.touch_user(1, "u1", None)
+    store.add_balance(1, 10, "admin_add")
+    store.add_stock("Gmail", ["a:1", "b:2"])
+    status, mails = store.purchase(1, "Gmail", 2, 8.0)
+    assert (status, sorted(mails)) == ("ok", ["a:1", "b:2"])
+    assert store.set_balance(1, 7.1, "admin_set")
+
+    assert store.get_balance(1) == 7.1
+    assert ledger(store) == [
+        (1, 10.0, 10.0, "admin_add", None),
+        (1, -8.0, 2.0, "purchase", "Gmail x2"),
+        (1, 5.1, 7.1, "admin_set", None),
+    ]
+    assert [row[2] for row in store.history(1, 2)] == ["admin_set", "purchase"]
+
+
+def test_refused_changes_leave_the_ledger_alone(store):
+    store.touch_user(1, "u1", None)
+    store.add_balance(1, 3, "admin_add")
+    store.add_stock("Gmail", ["a:1"])
+
+    assert store.purchase(1, "Gmail", 1, 4.0) == ("no_balance", [])
+    assert store.purchase(1, "Gmail", 2, 2.0) == ("no_stock", [])
+    assert not store.add_balance(2, 5, "admin_add")
+    assert not store.set_balance(2, 5, "admin_set")
+    assert len(ledger(store)) == 1
+    assert store.stock_counts() == {"Gmail": 1}
+
+
+def test_deposit_is_credited_once(store):
+    store.touch_user(1, "u1", None)
+    dep_id = store.add_deposit(1, "bkash", "017", 50.0, "tx1")
+
+    assert store.approve_deposit(dep_id)
+    assert not store.approve_deposit(dep_id)
+    assert not store.reject_deposit(dep_id)
+    assert store.get_balance(1) == 50.0
+    assert ledger(store) == [(1, 50.0, 50.0, "deposit", str(dep_id))]
+
+
+def test_reconcile_only_reads_new_ledger_rows(store):
+    for uid in (1, 2, 3):
+        store.touch_user(uid, f"u{uid}", None)
+        store.add_balance(uid, 10, "admin_add")
+    # from another thread, as reconcile_loop runs it; batch=2 splits the users over two transactions
+    with ThreadPoolExecutor(1) as pool:
+        assert pool.submit(store.reconcile, 2).result() == []
+    assert checkpoints(store) == [(1, 1, 10.0), (2, 2, 10.0), (3, 3, 10.0)]
+
+    store.add_balance(2, -4, "admin_del")
+    # an already folded row changing is not re-read; a cached balance going off is caught
+    store.conn.execute("UPDATE ledger SET delta=99 WHERE id=1")
+    store.conn.execute("UPDATE users SET balance=12 WHERE user_id=3")
+    store.conn.commit()
+
+    assert store.reconcile(batch=2) == [(3, 12.0, 10.0)]
+    assert checkpoints(store) == [(1, 1, 10.0), (2, 4, 6.0), (3, 3, 10.0)]
+
+
+def test_reconcile_reports_users_without_ledger_rows(store):
+    store.touch_user(1, "u1", None)
+    store.conn.execute("UPDATE users SET balance=5 WHERE user_id=1")
+    store.conn.commit()
+
+    assert store.reconcile() == [(1, 5.0, 0.0)]
+
+
+def test_opening_entries_are_written_once(sqlite_bot, tmp_path):
+    path = str(tmp_path / "bot.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute("""CREATE TABLE users(user_id INTEGER PRIMARY KEY, username TEXT, balance REAL DEFAULT 0,
+                      purchased INTEGER DEFAULT 0, last_active TEXT)""")
+    legacy.execute("INSERT INTO users(user_id, balance) VALUES(1, 5.5), (2, 0)")
+    legacy.commit()
+    legacy.close()
+
+    store = sqlite_bot.SQLiteStorage(path)
+    assert ledger(store) == [(1, 5.5, 5.5, "opening", None)]
+    store.conn.execute("UPDATE users SET balance=9 WHERE user_id=2")
+    store.conn.commit()
+    store.close()
+
+    # a restart must not paper over the out-of-band edit
+    store = sqlite_bot.SQLiteStorage(path)
+    try:
+        assert len(ledger(store)) == 1
+        assert store.reconcile() == [(2, 9.0, 0.0)]
+    finally:
+        store.close()
@@ -0,0 +1,100 @@
+"""ThrottlingMiddleware: token buckets, the LRU cap and repeat callback taps."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+
+class Call:
+    """The parts of a CallbackQuery the middleware touches."""
+
+    def __init__(self, uid, data):
+        self.from_user = SimpleNamespace(id=uid)
+        self.data = data
+        self.answers = []
+
+    async def answer(self, text=None):
+        self.answers.append(text)
+
+
+@pytest.fixture
+def mw(sqlite_bot):
+    return sqlite_bot.ThrottlingMiddleware(limits={"menu": (1.0, 3), "purchase": (1.0, 1), "admin": (1.0, 10)})
+
+
+def passes(sqlite_bot, mw, call, data=None):
+    """Run pre-process; the data dict is what aiogram later hands to post-process."""
+    try:
+        asyncio.run(mw.on_pre_process_callback_query(call, {} if data is None else data))
+    except sqlite_bot.CancelHandler:
+        return False
+    return True
+
+
+def test_bucket_allows_a_burst_then_warns_once(mw):
+    assert [mw.take(1, "menu") for _ in range(3)] == [(True, False)] * 3
+    assert mw.take(1, "menu") == (False, True)
+    assert mw.take(1, "menu") == (False, False)
+    # other users and other route classes have their own buckets
+    assert mw.take(2, "menu") == (True, False)
+    assert mw.take(1, "purchase") == (True, False)
+
+
+def test_bucket_refills_with_time(mw):
+    for _ in range(4):
+        mw.take(1, "menu")
+    mw._buckets[(1, "menu")][1] -= 2.0   # two seconds pass at 1 token/s
+    assert [mw.take(1, "menu")[0] for _ in range(3)] == [True, True, False]
+
+
+def test_buckets_are_lru_capped(sqlite_bot):
+    mw = sqlite_bot.ThrottlingMiddleware(max_entries=2)
+    mw.take(1, "menu")
+    mw.take(2, "menu")
+    mw.take(1, "menu")
+    mw.take(3, "menu")
+    assert list(mw._buckets) == [(1, "menu"), (3, "menu")]
+
+
+def test_callback_route_goes_by_sender(sqlite_bot):
+    admin = sqlite_bot.ADMIN_ID
+    assert sqlite_bot.callback_route(Call(admin, "buy_Gmail")) == "admin"
+    assert sqlite_bot.callback_route(Call(5, "admin_stats")) == "menu"
+    assert sqlite_bot.callback_route(Call(5, "approve_1")) == "menu"
+    assert sqlite_bot.callback_route(Call(5, "multi_Gmail")) == "purchase"
+
+
+def test_admin_callbacks_from_others_stop_at_admin_only(sqlite_bot):
+    first = sqlite_bot.dp.callback_query_handlers.handlers[0]
+    assert first.handler is sqlite_bot.admin_only
+    # the handler's own lambda; aiogram adds a state filter that needs a live dispatcher
+    matches = next(f.filter for f in first.filters if getattr(f.filter, "__name__", None) == "<lambda>")
+
+    assert matches(Call(5, "approve_1"))
+    assert not matches(Call(sqlite_bot.ADMIN_ID, "approve_1"))
+    assert not matches(Call(5, "buy_Gmail"))
+
+
+def test_repeat_tap_is_dropped_only_while_the_first_is_handled(sqlite_bot, mw):
+    mw.limits["purchase"] = (1.0, 10)
+    first = {}
+    assert passes(sqlite_bot, mw, Call(5, "buy_Gmail"), first)
+    repeat = Call(5, "buy_Gmail")
+    assert not passes(sqlite_bot, mw, repeat)
+    assert repeat.answers == [None]
+    # a different button, or another user, is not a repeat
+    assert passes(sqlite_bot, mw, Call(5, "buy_Hotmail"))
+    assert passes(sqlite_bot, mw, Call(6, "buy_Gmail"))
+
+    asyncio.run(mw.on_post_process_callback_query(Call(5, "buy_Gmail"), [], first))
+    assert passes(sqlite_bot, mw, Call(5, "buy_Gmail"))
+
+
+def test_throttled_tap_is_not_left_in_flight(sqlite_bot, mw):
+    assert passes(sqlite_bot, mw, Call(5, "buy_Gmail"), {})
+    mw._in_flight.clear()
+    refused = Call(5, "buy_Gmail")
+    assert not passes(sqlite_bot, mw, refused)
+    assert refused.answers == [sqlite_bot.THROTTLE_TEXT]
+    assert not mw._in_flight